@@ -39,8 +39,8 @@ for m in st.session_state.messages:
         if m.get("sources"):
             with st.expander("Sources"):
                 for i, s in enumerate(m["sources"], 1):
-                    meta = f"[{i}] {os.path.basename(s.get('source',''))} | მუხლი: {s.get('article','')}"
-                    st.markdown(f"**{meta}**\n\n{(s.get('text') or '')[:600]}")
+                    meta = f"[{i}] {os.path.basename(s.source)} | მუხლი: {s.article}"
+                    st.markdown(f"**{meta}**\n\n{s.text[:600]}")
 
 
 prompt = st.chat_input("დასვი კითხვა სამოქალაქო კოდექსზე…")
@@ -63,8 +63,8 @@ if prompt:
         if contexts:
             with st.expander("Sources"):
                 for i, s in enumerate(contexts, 1):
-                    meta = f"[{i}] {os.path.basename(s.get('source',''))} | მუხლი: {s.get('article','')}"
-                    st.markdown(f"**{meta}**\n\n{(s.get('text') or '')[:600]}")
+                    meta = f"[{i}] {os.path.basename(s.source)} | მუხლი: {s.article}"
+                    st.markdown(f"**{meta}**\n\n{s.text[:600]}")
 
         st.session_state.messages.append(
             {"role": "assistant", "content": answer or "", "sources": contexts}
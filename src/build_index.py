@@ -5,22 +5,30 @@ import os
 import sys
 import time
 import logging
-from concurrent.futures import ThreadPoolExecutor, as_completed
+import mmap
+import re
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from queue import Queue
-from threading import Thread
-from typing import List, Dict
+from threading import Event, Lock, Thread
+from typing import Deque, Dict, Iterable, List, Optional, Set, Tuple
 
 # Ensure local imports work when running from repo root
 THIS_DIR = Path(__file__).resolve().parent
 if str(THIS_DIR) not in sys.path:
     sys.path.insert(0, str(THIS_DIR))
 
-from chunking import split_into_chunks, iter_chunks
+from chunking import Chunk, split_into_chunks, iter_chunks
 from embeddings import Embeddings
 from dotenv import load_dotenv
 
 
+load_dotenv()
+
+_SENTINEL = None
+
+
 def _setup_logging():
     level = os.getenv("LOG_LEVEL", "INFO").upper()
     logging.basicConfig(
@@ -29,14 +37,17 @@ def _setup_logging():
     )
 
 
-def _ensure_index(pc, index_name: str, dimension: int) -> None:
+def _ensure_index(pc, index_name: str, dimension: int, pool_threads: int):
+    """Return a handle to `index_name`, creating the index first if missing."""
     from pinecone import ServerlessSpec  # type: ignore
+    from pinecone.exceptions import NotFoundException  # type: ignore
 
-    # Create if missing; validate dims otherwise
-    existing = pc.list_indexes()
-    existing_names = [ix["name"] if isinstance(ix, dict) else getattr(ix, "name", None) for ix in existing]
-    if index_name in existing_names:
-        return
+    # Opening the handle resolves the index host, which doubles as the
+    # existence check on the (common) happy path
+    try:
+        return pc.Index(index_name, pool_threads=pool_threads)
+    except NotFoundException:
+        pass
     cloud = os.getenv("PINECONE_CLOUD", "aws")
     region = os.getenv("PINECONE_REGION", "us-east-1")
     pc.create_index(
@@ -46,6 +57,7 @@ def _ensure_index(pc, index_name: str, dimension: int) -> None:
         spec=ServerlessSpec(cloud=cloud, region=region),
         deletion_protection=os.getenv("PINECONE_DELETION_PROTECTION", "disabled"),
     )
+    return pc.Index(index_name, pool_threads=pool_threads)
 
 
 def _batch(iterable, size: int):
@@ -59,38 +71,245 @@ def _batch(iterable, size: int):
         yield buf
 
 
-def _embed_parallel(embed: Embeddings, chunks: List[Dict], workers: int) -> List[List[float]]:
-    """Embed chunks concurrently, preserving order."""
-    texts = [c["content"] for c in chunks]
-    if workers <= 1:
+def _embed_parallel(embed: Embeddings, chunks: List[Chunk]) -> List[List[float]]:
+    """
+    Embed a whole batch in one call so the model can batch internally.
+
+    Repeated texts (boilerplate headers etc.) are embedded once and their
+    vectors scattered back to every position.
+    """
+    texts = [c.content for c in chunks]
+    unique_texts = list(dict.fromkeys(texts))
+    if len(unique_texts) == len(texts):
         return embed.embed(texts, mode="document")
-    vectors: List[List[float]] = [None] * len(texts)  # type: ignore
-    with ThreadPoolExecutor(max_workers=workers) as ex:
-        future_map = {ex.submit(embed.embed, [txt], mode="document"): i for i, txt in enumerate(texts)}
-        for fut in as_completed(future_map):
-            idx = future_map[fut]
-            try:
-                vectors[idx] = fut.result()[0]
-            except Exception as exc:
-                logging.error("Embedding failed for chunk %d: %s", idx, exc)
-                raise
-    return vectors
-
-
-def _start_upsert_worker(index, q: Queue) -> Thread:
-    def _worker():
-        while True:
-            item = q.get()
-            if item is None:
-                break
-            try:
-                index.upsert(vectors=item)
-            finally:
-                q.task_done()
-
-    t = Thread(target=_worker, daemon=True)
-    t.start()
-    return t
+    emb_map = dict(zip(unique_texts, embed.embed(unique_texts, mode="document")))
+    return [emb_map[t] for t in texts]
+
+
+def _build_payloads(doc_id: str, file_path: str, batch: List[Chunk], vectors: List[List[float]]) -> List[Dict]:
+    payloads: List[Dict] = []
+    for chunk, vec in zip(batch, vectors):
+        uid = f"{doc_id}-{chunk.start}-{chunk.end}"
+        metadata = {
+            "doc_id": doc_id,
+            "source": file_path,
+            "section_title": chunk.section_title,
+            "article": chunk.article,
+            "start": chunk.start,
+            "end": chunk.end,
+            "text": chunk.content,
+        }
+        payloads.append({"id": uid, "values": vec, "metadata": metadata})
+    return payloads
+
+
+def _upsert_async(index, payloads: List[Dict], chunk_size: int) -> List:
+    """Fire one async upsert per sub-chunk; callers `.get()` the results."""
+    return [index.upsert(vectors=c, async_req=True) for c in _batch(payloads, chunk_size)]
+
+
+def _run_pipeline(
+    chunks: Iterable[Chunk],
+    embed: Embeddings,
+    index,
+    doc_id: str,
+    file_path: str,
+    batch_size: int,
+    max_chunks: Optional[int],
+    embed_workers: int,
+    pool_threads: int,
+    upsert_chunk_size: int,
+) -> Tuple[int, Set[str]]:
+    """
+    Run chunking, embedding and upserting as overlapping stages.
+
+    A producer thread batches chunks into `embed_q`, `embed_workers` threads
+    embed whole batches into `upsert_q`, and the calling thread drains
+    `upsert_q` into async upserts. Returns the number of chunks produced and
+    the ids upserted.
+    """
+    embed_q: Queue = Queue(maxsize=4)
+    upsert_q: Queue = Queue(maxsize=4)
+    stop = Event()
+    errors: List[BaseException] = []
+    produced = 0
+    upserted: Set[str] = set()
+
+    def _producer() -> None:
+        nonlocal produced
+        try:
+            for batch_idx, batch in enumerate(_batch(chunks, batch_size), 1):
+                if stop.is_set() or (max_chunks is not None and produced >= max_chunks):
+                    break
+                if max_chunks is not None and produced + len(batch) > max_chunks:
+                    batch = batch[: max_chunks - produced]
+                produced += len(batch)
+                embed_q.put((batch_idx, batch))
+        except BaseException as exc:
+            errors.append(exc)
+            stop.set()
+        finally:
+            for _ in range(embed_workers):
+                embed_q.put(_SENTINEL)
+
+    def _embedder() -> None:
+        try:
+            while True:
+                item = embed_q.get()
+                if item is _SENTINEL:
+                    break
+                if stop.is_set():
+                    continue  # keep draining so the producer never blocks
+                batch_idx, batch = item
+                t_embed = time.perf_counter()
+                try:
+                    vectors = _embed_parallel(embed, batch)
+                except BaseException as exc:
+                    logging.error("Embedding failed for batch %d: %s", batch_idx, exc)
+                    errors.append(exc)
+                    stop.set()
+                    continue
+                logging.info(
+                    "Embedded batch %d | size=%d in %.2fs",
+                    batch_idx,
+                    len(batch),
+                    time.perf_counter() - t_embed,
+                )
+                upsert_q.put(_build_payloads(doc_id, file_path, batch, vectors))
+        finally:
+            upsert_q.put(_SENTINEL)
+
+    threads = [Thread(target=_producer, daemon=True)]
+    threads += [Thread(target=_embedder, daemon=True) for _ in range(embed_workers)]
+    for t in threads:
+        t.start()
+
+    # In-flight async upserts, capped at `pool_threads` to respect rate limits
+    in_flight: Deque = deque()
+    finished = 0
+    try:
+        while finished < embed_workers:
+            payloads = upsert_q.get()
+            if payloads is _SENTINEL:
+                finished += 1
+                continue
+            if stop.is_set():
+                continue
+            upserted.update(p["id"] for p in payloads)
+            in_flight.extend(_upsert_async(index, payloads, upsert_chunk_size))
+            while len(in_flight) > pool_threads:
+                in_flight.popleft().get()
+        # Surface any upsert errors before the document is marked as indexed
+        while in_flight:
+            in_flight.popleft().get()
+    except BaseException:
+        stop.set()
+        # Unblock the stages so the threads can exit
+        while finished < embed_workers:
+            if upsert_q.get() is _SENTINEL:
+                finished += 1
+        raise
+    finally:
+        for t in threads:
+            t.join()
+
+    if errors:
+        raise errors[0]
+    return produced, upserted
+
+
+def _delete_stale(index, doc_id: str, keep: Set[str]) -> int:
+    """
+    Delete vectors of `doc_id` that the latest run did not upsert.
+
+    Chunk ids embed character offsets, so re-chunking a changed document
+    would otherwise leave its old chunks searchable next to the new ones.
+    """
+    # The prefix alone would also match documents named `<doc_id>-...`
+    own_id = re.compile(rf"{re.escape(doc_id)}-\d+-\d+")
+    stale: List[str] = []
+    for page in index.list(prefix=f"{doc_id}-"):
+        for item in page:
+            # Newer SDKs (10.x) yield ListItem objects rather than id strings
+            vid = getattr(item, "id", item)
+            if vid not in keep and own_id.fullmatch(vid):
+                stale.append(vid)
+    for ids in _batch(stale, 1000):
+        index.delete(ids=ids)
+    return len(stale)
+
+
+def _write_manifest(manifest: Dict[str, Dict[str, str]], manifest_path: Path) -> None:
+    """Atomically replace the manifest file via a temp file + os.replace."""
+    tmp_path = manifest_path.with_suffix(".json.tmp")
+    with open(tmp_path, "w", encoding="utf-8") as mf:
+        json.dump(manifest, mf, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, manifest_path)
+
+
+def _index_one_file(
+    file_path: str,
+    embed: Embeddings,
+    index,
+    manifest: Dict[str, Dict[str, str]],
+    manifest_lock: Lock,
+    batch_size: int,
+    target_tokens: int,
+    overlap_tokens: int,
+    max_chunks: Optional[int],
+    embed_workers: int,
+    pool_threads: int,
+    upsert_chunk_size: int,
+) -> None:
+    """Chunk, embed and upsert a single document, then record it in `manifest`."""
+    t0 = time.perf_counter()
+    doc_id = os.path.splitext(os.path.basename(file_path))[0]
+    # Hash and decode from one read-only mapping: no intermediate bytes copy,
+    # and unchanged documents are never decoded
+    with open(file_path, "rb") as fb:
+        if os.fstat(fb.fileno()).st_size == 0:
+            buf = b""  # empty files cannot be mmapped
+        else:
+            buf = mmap.mmap(fb.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            doc_hash = hashlib.sha256(buf).hexdigest()
+            with manifest_lock:
+                unchanged = manifest.get(doc_id, {}).get("hash") == doc_hash
+            if unchanged:
+                logging.info("%s unchanged; skipping", doc_id)
+                return
+            text = str(buf, "utf-8")
+        finally:
+            if isinstance(buf, mmap.mmap):
+                buf.close()
+    # Stream chunks to avoid holding everything in memory
+    gen = iter_chunks(
+        text,
+        target_tokens=target_tokens,
+        overlap_tokens=overlap_tokens,
+        use_sections=True,
+    )
+
+    # Chunk -> embed -> upsert pipeline
+    produced, upserted = _run_pipeline(
+        gen,
+        embed,
+        index,
+        doc_id=doc_id,
+        file_path=file_path,
+        batch_size=batch_size,
+        max_chunks=max_chunks,
+        embed_workers=embed_workers,
+        pool_threads=pool_threads,
+        upsert_chunk_size=upsert_chunk_size,
+    )
+    logging.info("%s: indexed %d chunks in %.2fs", doc_id, produced, time.perf_counter() - t0)
+    # Only once the new chunks are in, so the document never drops out of search
+    removed = _delete_stale(index, doc_id, upserted)
+    if removed:
+        logging.info("%s: deleted %d stale chunks", doc_id, removed)
+    with manifest_lock:
+        manifest[doc_id] = {"hash": doc_hash, "algo": "sha256"}
 
 
 def build_index(
@@ -99,10 +318,28 @@ def build_index(
     index_name: str = os.getenv("PINECONE_INDEX_NAME", "legal-rag-index"),
     batch_size: int = int(os.getenv("INDEX_BATCH_SIZE", "32")),
 ):
-    load_dotenv()
-    _setup_logging()
     from pinecone import Pinecone  # type: ignore
 
+    # Indexing knobs are read once per run, not per document
+    target_tokens = int(os.getenv("CHUNK_TARGET_TOKENS", "300"))
+    overlap_tokens = int(os.getenv("CHUNK_OVERLAP_TOKENS", "40"))
+    max_chunks_env = os.getenv("MAX_CHUNKS_PER_DOC")
+    try:
+        max_chunks = int(max_chunks_env) if max_chunks_env else None
+    except ValueError:
+        max_chunks = None
+    embed_workers = max(1, int(os.getenv("EMBED_CONCURRENCY", "4")))
+    file_workers = max(1, int(os.getenv("FILE_CONCURRENCY", "2")))
+    pool_threads = max(1, int(os.getenv("PINECONE_POOL_THREADS", "10")))
+    upsert_chunk_size = int(os.getenv("UPSERT_BATCH_SIZE", "100"))
+    manifest_path = Path(os.getenv("INDEX_MANIFEST", "data/index_manifest.json"))
+    logging.info(
+        "Chunking params | target_tokens=%d overlap_tokens=%d batch_size=%d",
+        target_tokens,
+        overlap_tokens,
+        batch_size,
+    )
+
     # 1) Prepare embeddings
     t0 = time.perf_counter()
     embed = Embeddings(provider=provider)  # model via env
@@ -115,12 +352,10 @@ def build_index(
 
     # 2) Prepare Pinecone
     pc = Pinecone(api_key=os.getenv("PINECONE_API_KEY"))
-    _ensure_index(pc, index_name, dimension=embed.dimension)
-    index = pc.Index(index_name)
+    index = _ensure_index(pc, index_name, dimension=embed.dimension, pool_threads=pool_threads)
     logging.info("Connected to Pinecone index '%s'", index_name)
 
     # 3) Load manifest for caching
-    manifest_path = Path(os.getenv("INDEX_MANIFEST", "data/index_manifest.json"))
     manifest: Dict[str, Dict[str, str]] = {}
     if manifest_path.exists():
         try:
@@ -133,78 +368,36 @@ def build_index(
     files = sorted(glob.glob(data_glob))
     logging.info("Found %d files to index (glob=%s)", len(files), data_glob)
 
-    for file_path in files:
-        with open(file_path, "r", encoding="utf-8") as f:
-            text = f.read()
-
-        doc_id = os.path.splitext(os.path.basename(file_path))[0]
-        doc_hash = hashlib.md5(text.encode("utf-8")).hexdigest()
-        if manifest.get(doc_id, {}).get("hash") == doc_hash:
-            logging.info("%s unchanged; skipping", doc_id)
-            continue
-        # Stream chunks to avoid holding everything in memory
-        target_tokens = int(os.getenv("CHUNK_TARGET_TOKENS", "300"))
-        overlap_tokens = int(os.getenv("CHUNK_OVERLAP_TOKENS", "40"))
-        logging.info(
-            "Chunking params | target_tokens=%d overlap_tokens=%d batch_size=%d",
-            target_tokens,
-            overlap_tokens,
-            batch_size,
-        )
-        gen = iter_chunks(
-            text,
-            target_tokens=target_tokens,
-            overlap_tokens=overlap_tokens,
-            use_sections=True,
-        )
-
-        max_chunks_env = os.getenv("MAX_CHUNKS_PER_DOC")
-        try:
-            max_chunks = int(max_chunks_env) if max_chunks_env else None
-        except ValueError:
-            max_chunks = None
-
-        produced = 0
-        batch_idx = 0
-        # Start upsert worker
-        q: Queue = Queue(maxsize=2)
-        worker = _start_upsert_worker(index, q)
-
-        # 5) Embed and upsert in batches
-        for batch in _batch(gen, batch_size):
-            if max_chunks is not None and produced >= max_chunks:
-                break
-            if max_chunks is not None and produced + len(batch) > max_chunks:
-                batch = batch[: max_chunks - produced]
-            produced += len(batch)
-            batch_idx += 1
-            logging.info("Embedding batch %d | size=%d", batch_idx, len(batch))
-            t_embed = time.perf_counter()
-            vectors = _embed_parallel(embed, batch, int(os.getenv("EMBED_CONCURRENCY", "4")))
-            logging.info("Embed done in %.2fs", time.perf_counter() - t_embed)
-            payloads: List[Dict] = []
-            for i, (chunk, vec) in enumerate(zip(batch, vectors)):
-                uid = f"{doc_id}-{chunk['start']}-{chunk['end']}"
-                metadata = {
-                    "doc_id": doc_id,
-                    "source": file_path,
-                    "section_title": chunk.get("section_title", ""),
-                    "article": chunk.get("article", ""),
-                    "start": chunk.get("start", 0),
-                    "end": chunk.get("end", 0),
-                    "text": chunk["content"],
-                }
-                payloads.append({"id": uid, "values": vec, "metadata": metadata})
-
-            q.put(payloads)
-        q.put(None)
-        worker.join()
-        logging.info("%s: indexed %d chunks in %.2fs", doc_id, produced, time.perf_counter() - t0)
-        manifest[doc_id] = {"hash": doc_hash}
-        with open(manifest_path, "w", encoding="utf-8") as mf:
-            json.dump(manifest, mf, ensure_ascii=False, indent=2)
-    logging.info("Indexing complete.")
+    # 5) Index files concurrently; only manifest updates are serialized
+    manifest_lock = Lock()
+    try:
+        with ThreadPoolExecutor(max_workers=file_workers) as ex:
+            futures = [
+                ex.submit(
+                    _index_one_file,
+                    file_path,
+                    embed,
+                    index,
+                    manifest,
+                    manifest_lock,
+                    batch_size=batch_size,
+                    target_tokens=target_tokens,
+                    overlap_tokens=overlap_tokens,
+                    max_chunks=max_chunks,
+                    embed_workers=embed_workers,
+                    pool_threads=pool_threads,
+                    upsert_chunk_size=upsert_chunk_size,
+                )
+                for file_path in files
+            ]
+            for fut in futures:
+                fut.result()
+    finally:
+        # Persist whatever finished, even if a later document failed
+        _write_manifest(manifest, manifest_path)
+    logging.info("Indexing complete in %.2fs.", time.perf_counter() - t0)
 
 
 if __name__ == "__main__":
+    _setup_logging()
     build_index()
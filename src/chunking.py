@@ -1,11 +1,30 @@
 import os
 import re
+from bisect import bisect_left, bisect_right
+from dataclasses import dataclass
 from typing import List, Dict, Optional, Tuple, Iterable, Iterator
 
 import tiktoken
 
 _ENCODING = tiktoken.get_encoding(os.getenv("TIKTOKEN_ENCODING", "cl100k_base"))
 
+# Match lines like: "მუხლი 12." or "მუხლი 12 " or " მუხლი 12. ..."
+_ARTICLE_RE = re.compile(r"(?m)^(\s*მუხლი\s+(\d+)[\.|\s].*)$")
+
+# Chunk boundary separators in priority order. Lookaheads keep overlapping
+# matches (e.g. "\n\n\n") so results agree with `str.rfind`.
+_SEPARATORS = ("\n\n", "\n", ". ", "? ", "! ")
+_SEPARATOR_RES = tuple((re.compile(f"(?={re.escape(sep)})"), len(sep)) for sep in _SEPARATORS)
+
+
+@dataclass(slots=True)
+class Chunk:
+    content: str
+    start: int
+    end: int
+    section_title: str
+    article: str
+
 
 def _find_article_sections(text: str) -> List[Tuple[int, int, Dict[str, str]]]:
     """
@@ -14,9 +33,7 @@ def _find_article_sections(text: str) -> List[Tuple[int, int, Dict[str, str]]]:
     Returns list of (start, end, meta) for each article block.
     If nothing matches, returns single block covering all text.
     """
-    # Match lines like: "მუხლი 12." or "მუხლი 12 " or " მუხლი 12. ..."
-    article_re = re.compile(r"(?m)^(\s*მუხლი\s+(\d+)[\.|\s].*)$")
-    matches = list(article_re.finditer(text))
+    matches = list(_ARTICLE_RE.finditer(text))
     if not matches:
         return [(0, len(text), {"section_title": "FULL_TEXT", "article": ""})]
 
@@ -31,9 +48,27 @@ def _find_article_sections(text: str) -> List[Tuple[int, int, Dict[str, str]]]:
 
 
 
-def _count_tokens(text: str) -> int:
-    """Return number of tokens for the given text using tiktoken."""
-    return len(_ENCODING.encode(text))
+def _boundary_positions(block: str) -> List[List[int]]:
+    """Return, per separator, the sorted end offsets of its occurrences in block."""
+    return [[m.start() + n for m in sep_re.finditer(block)] for sep_re, n in _SEPARATOR_RES]
+
+
+def _find_boundary(boundaries: List[List[int]], start: int, end: int, after: int) -> int:
+    """
+    Latest boundary of the highest-priority separator lying fully inside
+    block[start:end] and ending past `after`, or -1 if none does.
+    """
+    for positions, (_, n) in zip(boundaries, _SEPARATOR_RES):
+        i = bisect_right(positions, end) - 1
+        if i >= 0 and positions[i] > after and positions[i] - n >= start:
+            return positions[i]
+    return -1
+
+
+def _token_offsets(block: str) -> List[int]:
+    """Encode block once and return the character offset where each token starts."""
+    _, offsets = _ENCODING.decode_with_offsets(_ENCODING.encode(block))
+    return offsets
 
 
 def iter_chunks(
@@ -41,8 +76,8 @@ def iter_chunks(
     target_tokens: int = 400,
     overlap_tokens: int = 50,
     use_sections: bool = True,
-) -> Iterator[Dict]:
-    """Yield chunk dicts without holding all in memory."""
+) -> Iterator[Chunk]:
+    """Yield chunks without holding all in memory."""
     blocks: List[Tuple[int, int, Dict[str, str]]]
     if use_sections:
         blocks = _find_article_sections(text)
@@ -51,38 +86,53 @@ def iter_chunks(
 
     for (b_start, b_end, meta) in blocks:
         block = text[b_start:b_end]
-        avg_chars_per_token = len(block) / max(1, _count_tokens(block))
+        # Walk exact token positions instead of estimating chars per token
+        offsets = _token_offsets(block)
+        n_tokens = len(offsets)
+        boundaries = _boundary_positions(block)
         start = 0
+        start_tok = 0
+        prev_end = 0
         while start < len(block):
-            approx_target_chars = int(target_tokens * avg_chars_per_token)
-            end = min(len(block), start + approx_target_chars)
-
-            boundary = -1
-            for sep in ["\n\n", "\n", ". ", "? ", "! "]:
-                idx = block.rfind(sep, start, end)
-                if idx != -1:
-                    boundary = idx + len(sep)
-                    break
-            if boundary != -1 and boundary > start:
+            end_tok = start_tok + target_tokens
+            end = offsets[end_tok] if end_tok < n_tokens else len(block)
+            if end <= start:
+                # Several tokens can share one character; always advance
+                end = start + 1
+
+            # Only snap to boundaries past the previous chunk's end: the
+            # overlap window would otherwise find the same one again (e.g. a
+            # "\n\n\n" page break) and emit near-duplicate chunks
+            boundary = _find_boundary(boundaries, start, end, max(start, prev_end))
+            if boundary != -1:
                 end = boundary
 
             content = block[start:end].strip()
-            if not content:
-                break
-            abs_start = b_start + start
-            abs_end = b_start + end
-            yield {
-                "content": content,
-                "start": abs_start,
-                "end": abs_end,
-                "section_title": meta.get("section_title", ""),
-                "article": meta.get("article", ""),
-            }
+            # Whitespace-only windows are skipped, not treated as end of block
+            if content:
+                yield Chunk(
+                    content=content,
+                    start=b_start + start,
+                    end=b_start + end,
+                    section_title=meta.get("section_title", ""),
+                    article=meta.get("article", ""),
+                )
 
             if end >= len(block):
                 break
-            overlap_chars = int(overlap_tokens * avg_chars_per_token)
-            start = max(0, end - overlap_chars)
+            prev_end = end
+            # Step back `overlap_tokens` from the first token at/after `end`,
+            # but never to (or before) the current start, nor so far that the
+            # next window cannot reach past `end`
+            next_tok = max(
+                start_tok + 1,
+                bisect_left(offsets, end) - overlap_tokens,
+                bisect_right(offsets, end) - target_tokens,
+            )
+            while next_tok < n_tokens and offsets[next_tok] <= start:
+                next_tok += 1
+            start_tok = next_tok
+            start = offsets[next_tok] if next_tok < n_tokens else end
 
 
 def split_into_chunks(
@@ -90,7 +140,7 @@ def split_into_chunks(
     target_tokens: int = 400,
     overlap_tokens: int = 50,
     use_sections: bool = True,
-) -> List[Dict]:
+) -> List[Chunk]:
     """Backwards-compatible wrapper that collects all chunks into a list."""
     return list(
         iter_chunks(
@@ -8,6 +8,30 @@ from dotenv import load_dotenv
 
 load_dotenv()
 
+_ST_DTYPES = ("auto", "float32", "float16", "bfloat16")
+
+
+def _select_dtype(torch, device: str) -> str:
+    """
+    Resolve ST_EMBED_DTYPE (auto|float32|float16|bfloat16) for the given device.
+
+    `auto` picks bfloat16 on CUDA GPUs that support it, float16 on other CUDA
+    GPUs and on MPS, and float32 on CPU. Without torch the model cannot be
+    cast, so float32 is returned whatever was requested.
+    """
+    dtype = os.getenv("ST_EMBED_DTYPE", "auto").lower()
+    if dtype not in _ST_DTYPES:
+        raise ValueError(f"Unsupported ST_EMBED_DTYPE: {dtype!r} (use {'|'.join(_ST_DTYPES)})")
+    if torch is None:
+        return "float32"
+    if dtype != "auto":
+        return dtype
+    if device.startswith("cuda"):
+        return "bfloat16" if torch.cuda.is_bf16_supported() else "float16"
+    if device.startswith("mps"):
+        return "float16"
+    return "float32"
+
 
 class Embeddings:
     def __init__(
@@ -44,21 +68,24 @@ class Embeddings:
                     env_device = "cpu"
             self.device = env_device
             self.batch_size = int(os.getenv("ST_EMBED_BATCH_SIZE", "8"))
+            # Resolved before the (slow) model load so a bad value fails fast
+            self.dtype = _select_dtype(torch, self.device)
 
+            # Let the fast (Rust) tokenizer use all cores unless told otherwise
+            os.environ.setdefault("TOKENIZERS_PARALLELISM", "true")
             self.client = SentenceTransformer(self.model, device=self.device)
-            # Infer dimension dynamically
-            try:
-                vec = self.client.encode(
-                    ["dim-probe"], normalize_embeddings=False, batch_size=self.batch_size
-                )
-                self._dimension = int(np.array(vec).shape[-1])
-            except Exception:
-                # Sensible fallback for many multilingual models
-                self._dimension = 1024
+            # Half precision on accelerators halves weight traffic and uses
+            # tensor cores; encode still returns float32 (see `embed`)
+            if self.dtype != "float32":
+                self.client = self.client.to(getattr(torch, self.dtype))
+            # Read dimension from the model config (no forward pass); 1024 is a
+            # sensible fallback for many multilingual models
+            self._dimension = int(self.client.get_sentence_embedding_dimension() or 1024)
             logging.info(
-                "Embeddings init | provider=sentence-transformers model=%s device=%s batch_size=%s dim=%s",
+                "Embeddings init | provider=sentence-transformers model=%s device=%s dtype=%s batch_size=%s dim=%s",
                 self.model,
                 self.device,
+                self.dtype,
                 self.batch_size,
                 self._dimension,
             )
@@ -82,10 +109,13 @@ class Embeddings:
         else:
             prefix = self._prefix_for_mode(mode)
             inputs = [prefix + t for t in texts]
+            # Unit-normalize inside encode (on-device) and keep the model's
+            # float32 output instead of upcasting to float64
             vecs = self.client.encode(
                 inputs,
-                normalize_embeddings=False,
+                normalize_embeddings=True,
+                convert_to_numpy=True,
                 batch_size=getattr(self, "batch_size", 8),
                 show_progress_bar=False,
             )  # type: ignore
-            return np.asarray(vecs, dtype=float).tolist()
+            return np.ascontiguousarray(vecs, dtype=np.float32).tolist()
@@ -1,38 +1,194 @@
-import fitz
+import glob
+import hashlib
+import logging
+import mmap
+import os
 import re
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, TextIO, Tuple
+
+import fitz
 
 # Input and output paths
-input_pdf = "./data/raw/matsne-31702-134.pdf"
-cleaned_txt = "./data/processed/matsne-31702-134.txt"
-
-# ---------- Step 1: Extract text from PDF ----------
-doc = fitz.open(input_pdf)
-all_text = ""
-for page in doc:
-    all_text += page.get_text("text") + "\n"
-
-# ---------- Step 2: Clean text ----------
-# Convert superscript numbers into dotted notation (e.g. 49¹ -> 49.1)
-SUPERSCRIPT_MAP = str.maketrans({
+raw_pdfs = "./data/raw/*.pdf"
+processed_dir = "./data/processed"
+
+# Pages handled per worker task
+PAGES_PER_TASK = 16
+# Sidecar recording the digest of the PDF an output was extracted from
+HASH_SUFFIX = ".pdfhash"
+
+# ---------- Cleaning rules ----------
+# All cleanup rules are fused into one alternation so the text is scanned once:
+# - superscript numbers become dotted notation (e.g. 49¹ -> 49.1)
+# - repetitive Matsne footer lines are removed
+# - soft hyphens are removed so words don’t break
+SUPERSCRIPT_MAP = {
     "¹": ".1", "²": ".2", "³": ".3", "⁴": ".4", "⁵": ".5",
     "⁶": ".6", "⁷": ".7", "⁸": ".8", "⁹": ".9", "⁰": ".0",
-})
-all_text = all_text.translate(SUPERSCRIPT_MAP)
-
-# Remove repetitive Matsne footer lines
-MATSNE_RE = re.compile(
-    r"http://www\.matsne\.gov\.ge\s*040\.000\.000\.05\.001\.000\.223",
-    re.MULTILINE
+}
+CLEAN_RE = re.compile(
+    r"[¹²³⁴⁵⁶⁷⁸⁹⁰]"
+    r"|http://www\.matsne\.gov\.ge\s*040\.000\.000\.05\.001\.000\.223"
+    r"|[\u00ad\u2010]"
 )
-all_text = MATSNE_RE.sub("", all_text)
 
-# Optional: Remove soft hyphens so words don’t break
-SOFT_HYPHENS = ("\u00ad", "\u2010")
-for sh in SOFT_HYPHENS:
-    all_text = all_text.replace(sh, "")
 
-# Save cleaned version
-with open(cleaned_txt, "w", encoding="utf-8") as f:
-    f.write(all_text)
+def clean_text(text: str) -> str:
+    return CLEAN_RE.sub(lambda m: SUPERSCRIPT_MAP.get(m.group(0), ""), text)
+
+
+# Per-worker-process cache of the most recently opened document:
+# (pdf_path, doc, memoryview it was opened from, mmap backing it). Pool
+# workers leave via os._exit, so the last one is released with the process
+# rather than closed
+_worker_doc: Optional[Tuple[str, "fitz.Document", memoryview, mmap.mmap]] = None
+
+
+def _close_worker_doc() -> None:
+    global _worker_doc
+    if _worker_doc is not None:
+        _, doc, mv, mm = _worker_doc
+        _worker_doc = None
+        # The document holds on to its stream; the view must be released
+        # before the mmap can be closed
+        doc.close()
+        mv.release()
+        mm.close()
+
+
+def _open_worker_doc(pdf_path: str) -> "fitz.Document":
+    """
+    Open pdf_path once per worker process, from a read-only mmap so that all
+    workers share the kernel page cache instead of each buffering the file.
+    """
+    global _worker_doc
+    if _worker_doc is not None and _worker_doc[0] == pdf_path:
+        return _worker_doc[1]
+    _close_worker_doc()
+    with open(pdf_path, "rb") as f:
+        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    mv = memoryview(mm)
+    doc = fitz.open(stream=mv, filetype="pdf")
+    _worker_doc = (pdf_path, doc, mv, mm)
+    return doc
+
+
+def _extract_pages(pdf_path: str, start: int, stop: int) -> str:
+    """Extract and clean pages [start, stop) of pdf_path (runs in a worker process)."""
+    doc = _open_worker_doc(pdf_path)
+    # Page separators are joined in separately rather than appended to each
+    # page, which would copy the whole page before cleaning it
+    return "\n".join(clean_text(doc[i].get_text("text")) for i in range(start, stop)) + "\n"
+
+
+def write_pdf_text(pdf_path: str, writer: TextIO, num_workers: Optional[int] = None) -> None:
+    """
+    Extract cleaned text from pdf_path and write it to writer page by page.
+
+    MuPDF text extraction is CPU-bound and holds the GIL, so page ranges are
+    spread over a process pool; results are written in page order as they
+    arrive, so the whole document is never held in memory.
+    """
+    with fitz.open(pdf_path) as doc:
+        page_count = doc.page_count
+        if num_workers is None:
+            num_workers = min(os.cpu_count() or 1, 4)
+        if num_workers <= 1 or page_count <= PAGES_PER_TASK:
+            for page in doc:
+                writer.write(clean_text(page.get_text("text")))
+                writer.write("\n")
+            return
+
+    starts = range(0, page_count, PAGES_PER_TASK)
+    stops = [min(s + PAGES_PER_TASK, page_count) for s in starts]
+    with ProcessPoolExecutor(max_workers=num_workers) as ex:
+        for text in ex.map(_extract_pages, repeat(pdf_path), starts, stops):
+            writer.write(text)
+
+
+def _pdf_digest(pdf_path: str) -> str:
+    with open(pdf_path, "rb") as f:
+        return hashlib.file_digest(f, lambda: hashlib.blake2b(digest_size=16)).hexdigest()
+
+
+def _is_fresh(out_path: str, digest: str) -> bool:
+    stamp = Path(out_path + HASH_SUFFIX)
+    return os.path.exists(out_path) and stamp.exists() and stamp.read_text().strip() == digest
+
+
+def _extract_to(pdf_path: str, out_path: str, digest: str, num_workers: Optional[int]) -> None:
+    with open(out_path, "w", encoding="utf-8", buffering=1 << 20) as f:
+        write_pdf_text(pdf_path, f, num_workers=num_workers)
+    # Written last, so an interrupted extraction is redone next time
+    Path(out_path + HASH_SUFFIX).write_text(digest + "\n")
+
+
+def extract_pdf(
+    pdf_path: str, out_path: str, num_workers: Optional[int] = None, force: bool = False
+) -> bool:
+    """
+    Extract cleaned text from pdf_path into out_path through a 1 MiB write buffer.
+
+    The source digest is recorded next to the output (`<out_path>.pdfhash`);
+    when it still matches, extraction is skipped. Returns True if the text was
+    (re)extracted.
+    """
+    digest = _pdf_digest(pdf_path)
+    if not force and _is_fresh(out_path, digest):
+        return False
+    _extract_to(pdf_path, out_path, digest, num_workers)
+    return True
+
+
+def extract_many(
+    pdf_paths: Sequence[str], out_dir: str, num_workers: Optional[int] = None, force: bool = False
+) -> Tuple[List[str], Dict[str, str]]:
+    """
+    Extract every PDF in pdf_paths to `<out_dir>/<stem>.txt` in one process pool.
+
+    Up-to-date outputs are skipped as in extract_pdf. A PDF whose digest matches
+    an earlier one gets no output of its own, since build_index would index the
+    same text twice. Returns the output paths that were (re)written and a map
+    of each skipped duplicate PDF to the PDF it duplicates.
+    """
+    if num_workers is None:
+        num_workers = min(os.cpu_count() or 1, 4)
+    os.makedirs(out_dir, exist_ok=True)
+
+    # digest -> first PDF seen with that content
+    sources: Dict[str, str] = {}
+    duplicates: Dict[str, str] = {}
+    pending: List[Tuple[str, str, str]] = []
+    for pdf_path in pdf_paths:
+        digest = _pdf_digest(pdf_path)
+        if digest in sources:
+            logging.info("Skipping %s: identical to %s", pdf_path, sources[digest])
+            duplicates[pdf_path] = sources[digest]
+            continue
+        sources[digest] = pdf_path
+        out_path = os.path.join(out_dir, Path(pdf_path).stem + ".txt")
+        if force or not _is_fresh(out_path, digest):
+            pending.append((pdf_path, out_path, digest))
+
+    if len(pending) == 1 or num_workers <= 1:
+        # Nothing to spread across files; parallelize over pages instead
+        for pdf_path, out_path, digest in pending:
+            _extract_to(pdf_path, out_path, digest, num_workers)
+    elif pending:
+        pdfs, outs, digests = zip(*pending)
+        with ProcessPoolExecutor(max_workers=min(num_workers, len(pending))) as ex:
+            list(ex.map(_extract_to, pdfs, outs, digests, repeat(1)))
+    return [out for _, out, _ in pending], duplicates
+
 
-print("Cleaned text saved to:", cleaned_txt)
+if __name__ == "__main__":
+    pdfs = sorted(glob.glob(raw_pdfs))
+    written, duplicates = extract_many(pdfs, processed_dir)
+    for out_path in written:
+        print("Cleaned text saved to:", out_path)
+    for pdf_path, source in duplicates.items():
+        print(f"Skipped {pdf_path}: identical to {source}")
+    print(f"{len(written)} of {len(pdfs)} PDF(s) extracted; the rest were unchanged")
@@ -1,14 +1,24 @@
 import os
-from typing import List, Dict
+from os.path import basename
+from typing import TYPE_CHECKING, List
 
 import google.generativeai as genai
 from dotenv import load_dotenv
 
 
+if TYPE_CHECKING:
+    from rag import Context
+
+
 load_dotenv()
 
 
-def _build_prompt(question: str, contexts: List[Dict]) -> str:
+def _format_context(i: int, c: "Context") -> str:
+    label = f"[{i}] წყარო: {basename(c.source)} | მუხლი: {c.article} | {c.section_title}".strip()
+    return f"{label}\n{c.text}\n"
+
+
+def _build_prompt(question: str, contexts: List["Context"]) -> str:
     """Build a single text prompt for Gemini including instructions and contexts."""
     system = (
         "You are a legal assistant answering strictly from provided Georgian Civil Code excerpts. "
@@ -17,24 +27,14 @@ def _build_prompt(question: str, contexts: List[Dict]) -> str:
     )
 
     context_header = "ქვემოთ მოცემულია შესაბამისი ამონაწერები (წყარო/მუხლი):\n\n"
-    context_blocks = []
-    for i, c in enumerate(contexts, 1):
-        title = c.get("section_title") or ""
-        article = c.get("article") or ""
-        src = c.get("source") or ""
-        snippet = c.get("text") or ""
-        label = f"[{i}] წყარო: {os.path.basename(src)} | მუხლი: {article} | {title}".strip()
-        block = f"{label}\n{snippet}\n"
-        context_blocks.append(block)
-
-    context_text = context_header + "\n\n".join(context_blocks)
+    context_blocks = [_format_context(i, c) for i, c in enumerate(contexts, 1)]
 
     user = (
         f"კითხვა: {question}\n\n"
         "პასუხი უნდა ემყარებოდეს მხოლოდ კონტექსტს. მიუთითე მუხლები, როცა საჭიროა."
     )
 
-    return system + "\n\n" + context_text + "\n\n" + user
+    return "\n\n".join([system, context_header + "\n\n".join(context_blocks), user])
 
 
 class GeminiLLM:
@@ -46,7 +46,7 @@ class GeminiLLM:
         self.model_name = model_name or os.getenv("GEMINI_MODEL", "gemini-1.5-flash")
         self.model = genai.GenerativeModel(self.model_name)
 
-    def answer(self, question: str, contexts: List[Dict]) -> str:
+    def answer(self, question: str, contexts: List["Context"]) -> str:
         prompt = _build_prompt(question, contexts)
         resp = self.model.generate_content(prompt)
         return getattr(resp, "text", "") or ""
@@ -1,4 +1,5 @@
 import os
+from dataclasses import dataclass
 from typing import Dict, List, Tuple
 
 from dotenv import load_dotenv
@@ -10,28 +11,37 @@ from gemini_llm import GeminiLLM
 load_dotenv()
 
 
+@dataclass(slots=True, frozen=True)
+class Context:
+    text: str
+    article: str
+    section_title: str
+    source: str
+    score: float
+
+
 class RAGPipeline:
     def __init__(self, index_name: str | None = None):
         self.index_name = index_name or os.getenv("PINECONE_INDEX_NAME", "legal-rag-index")
         self.retriever = Retriever(index_name=self.index_name)
         self.llm = GeminiLLM()
 
-    def _prepare_contexts(self, hits: List[Dict]) -> List[Dict]:
-        contexts: List[Dict] = []
+    def _prepare_contexts(self, hits: List[Dict]) -> List[Context]:
+        contexts: List[Context] = []
         for h in hits:
-            md = h.get("metadata", {})
+            md = h.get("metadata") or {}
             contexts.append(
-                {
-                    "text": h.get("text", ""),
-                    "article": md.get("article", ""),
-                    "section_title": md.get("section_title", ""),
-                    "source": md.get("source", ""),
-                    "score": h.get("score", 0.0),
-                }
+                Context(
+                    text=h.get("text") or "",
+                    article=md.get("article") or "",
+                    section_title=md.get("section_title") or "",
+                    source=md.get("source") or "",
+                    score=h.get("score", 0.0),
+                )
             )
         return contexts
 
-    def ask(self, question: str, top_k: int = 6) -> Tuple[str, List[Dict]]:
+    def ask(self, question: str, top_k: int = 6) -> Tuple[str, List[Context]]:
         hits = self.retriever.query(question, top_k=top_k)
         contexts = self._prepare_contexts(hits)
         answer = self.llm.answer(question, contexts)
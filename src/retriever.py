@@ -1,7 +1,15 @@
+import functools
 import os
+import random
 import sys
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
 from pathlib import Path
-from typing import List, Dict
+from queue import Empty, Queue
+from threading import Thread
+from typing import Callable, List, Dict, Sequence, Tuple, TypeVar
+
+import numpy as np
 
 # Ensure local imports work when running from repo root
 THIS_DIR = Path(__file__).resolve().parent
@@ -9,30 +17,218 @@ if str(THIS_DIR) not in sys.path:
     sys.path.insert(0, str(THIS_DIR))
 
 from embeddings import Embeddings
+from semantic_cache import SemanticCache
 from dotenv import load_dotenv
+from pinecone import Pinecone  # type: ignore
+from urllib3.exceptions import MaxRetryError, ProtocolError, TimeoutError as Urllib3TimeoutError
+
+try:
+    # Optional: pip install "pinecone[grpc]"
+    from pinecone.grpc import PineconeGRPC  # type: ignore
+except ImportError:
+    PineconeGRPC = None
+
+T = TypeVar("T")
+
+
+@functools.lru_cache(maxsize=4)
+def _get_pc(api_key: str, grpc: bool = False):
+    if grpc and PineconeGRPC is not None:
+        return PineconeGRPC(api_key=api_key)
+    return Pinecone(api_key=api_key)
+
+
+@functools.lru_cache(maxsize=4)
+def _get_index(api_key: str, index_name: str, pool_maxsize: int, grpc: bool = False):
+    # Each handle owns its own keep-alive connection pool (or HTTP/2 channel
+    # for gRPC); reuse it across Retrievers
+    pc = _get_pc(api_key, grpc)
+    if grpc and PineconeGRPC is not None:
+        return pc.Index(index_name)
+    # urllib3 keeps at most `pool_maxsize` idle connections per host; extra
+    # concurrent requests open a fresh TLS connection and then drop it.
+    # SDK 8+ no longer takes the kwarg and sizes the pool itself
+    try:
+        return pc.Index(index_name, connection_pool_maxsize=pool_maxsize)
+    except TypeError:
+        return pc.Index(index_name)
+
+
+_TRANSIENT_ERRORS = (ConnectionError, TimeoutError, MaxRetryError, ProtocolError, Urllib3TimeoutError)
+_TRANSIENT_GRPC_CODES = {"UNAVAILABLE", "DEADLINE_EXCEEDED", "RESOURCE_EXHAUSTED"}
+
+
+def _is_transient(exc: BaseException) -> bool:
+    # Only rate limits, server errors and connection/timeout failures are
+    # worth retrying; anything else (bad vector, auth, local bugs) is raised
+    status = getattr(exc, "status", None)
+    if isinstance(status, int):
+        return status == 429 or status >= 500
+    if isinstance(exc, _TRANSIENT_ERRORS):
+        return True
+    # gRPC errors may arrive wrapped in a PineconeException
+    for err in (exc, exc.__cause__):
+        code = getattr(err, "code", None)
+        if callable(code) and getattr(code(), "name", None) in _TRANSIENT_GRPC_CODES:
+            return True
+    return False
+
+
+def _with_retry(fn: Callable[[], T], attempts: int, base: float = 0.05, cap: float = 0.5) -> T:
+    """Call fn, retrying transient failures with full-jitter exponential backoff."""
+    attempt = 0
+    while True:
+        try:
+            return fn()
+        except Exception as exc:
+            attempt += 1
+            if attempt >= attempts or not _is_transient(exc):
+                raise
+            time.sleep(random.uniform(0, min(cap, base * 2 ** (attempt - 1))))
+
+
+@functools.lru_cache(maxsize=4)
+def _get_embeddings(provider: str) -> Embeddings:
+    # Loading a local model is expensive; share one instance per provider
+    return Embeddings(provider=provider)  # type: ignore[arg-type]
+
+
+def _quantize_int8(vec: Sequence[float]) -> List[float]:
+    """
+    Snap a query vector onto an int8 grid scaled by its own max |v|.
+
+    Values become small integers (e.g. -37.0), which serialize to a fraction
+    of the bytes of full float32 reprs. Only valid for cosine indexes, where
+    the per-vector scale cancels out.
+    """
+    v = np.asarray(vec, dtype=np.float32)
+    peak = float(np.abs(v).max()) if v.size else 0.0
+    if peak == 0.0:
+        return v.tolist()
+    return np.clip(np.rint(v * (127.0 / peak)), -127, 127).tolist()
+
+
+class _QueryBatcher:
+    """
+    Coalesce concurrent single-query embeds into one batched embed call.
+
+    Callers block on a Future; a background thread collects requests for up to
+    `window_s` seconds or `max_batch` items, embeds them together and fans the
+    vectors back out.
+    """
+
+    def __init__(self, embed: Embeddings, window_s: float, max_batch: int):
+        self._embed = embed
+        self._window_s = window_s
+        self._max_batch = max_batch
+        self._q: Queue = Queue()
+        Thread(target=self._run, daemon=True).start()
+
+    def embed(self, q: str) -> List[float]:
+        fut: Future = Future()
+        self._q.put((q, fut))
+        return fut.result()
+
+    def _run(self) -> None:
+        while True:
+            items: List[Tuple[str, Future]] = [self._q.get()]
+            deadline = time.monotonic() + self._window_s
+            while len(items) < self._max_batch:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    items.append(self._q.get(timeout=timeout))
+                except Empty:
+                    break
+            try:
+                vecs = self._embed.embed([q for q, _ in items], mode="query")
+            except BaseException as exc:
+                for _, fut in items:
+                    fut.set_exception(exc)
+                continue
+            for (_, fut), vec in zip(items, vecs):
+                fut.set_result(vec)
 
 
 class Retriever:
     def __init__(self, index_name: str):
-        from pinecone import Pinecone  # type: ignore
-
         load_dotenv()
         self.index_name = index_name
-        self.pc = Pinecone(api_key=os.getenv("PINECONE_API_KEY"))
-        self.index = self.pc.Index(index_name)
-        self.embed = Embeddings(provider=os.getenv("EMBEDDING_PROVIDER", "openai"))
+        api_key = os.getenv("PINECONE_API_KEY", "")
+        use_grpc = os.getenv("PINECONE_GRPC", "0").lower() in ("1", "true", "yes")
+        self.query_concurrency = max(1, int(os.getenv("QUERY_CONCURRENCY", "8")))
+        self.query_attempts = max(1, int(os.getenv("PINECONE_QUERY_ATTEMPTS", "3")))
+        self.pc = _get_pc(api_key, use_grpc)
+        # Resolving the index host is a network round-trip and loading the
+        # embedding model is disk/CPU work; do them concurrently
+        with ThreadPoolExecutor(max_workers=1) as ex:
+            # Keep a warm connection for every query_batch worker, without
+            # shrinking the SDK default of 5 per CPU
+            pool_maxsize = max(self.query_concurrency, (os.cpu_count() or 1) * 5)
+            index_fut = ex.submit(_get_index, api_key, index_name, pool_maxsize, use_grpc)
+            self.embed = _get_embeddings(os.getenv("EMBEDDING_PROVIDER", "openai"))
+            self.index = index_fut.result()
+        self.quantization = os.getenv("PINECONE_QUANTIZATION", "none").lower()
+        if self.quantization not in ("none", "int8"):
+            raise ValueError(f"Unsupported PINECONE_QUANTIZATION: {self.quantization!r} (use none|int8)")
+        # Opt-in: coalesce concurrent query() calls (e.g. several UI sessions)
+        window_ms = float(os.getenv("QUERY_BATCH_WINDOW_MS", "0"))
+        self._batcher = (
+            _QueryBatcher(self.embed, window_ms / 1000.0, int(os.getenv("QUERY_BATCH_MAX", "32")))
+            if window_ms > 0
+            else None
+        )
+        cache_size = int(os.getenv("QUERY_CACHE_SIZE", "1024"))
+        # Opt-in: serve hits of a *similar* earlier question, see SemanticCache
+        tau = os.getenv("QUERY_CACHE_TAU", "")
+        self.cache = (
+            SemanticCache(
+                self.embed.dimension,
+                max_size=cache_size,
+                ttl=float(os.getenv("QUERY_CACHE_TTL", "300")),
+                tau=float(tau) if tau else None,
+            )
+            if cache_size > 0
+            else None
+        )
 
-    def query(self, q: str, top_k: int = 8) -> List[Dict]:
-        vec = self.embed.embed([q], mode="query")[0]
-        res = self.index.query(vector=vec, top_k=top_k, include_metadata=True)
+    def _search(self, vec: List[float], top_k: int) -> List[Dict]:
+        if self.quantization == "int8":
+            vec = _quantize_int8(vec)
+        res = _with_retry(
+            lambda: self.index.query(vector=vec, top_k=top_k, include_metadata=True),
+            self.query_attempts,
+        )
         out: List[Dict] = []
         for m in getattr(res, "matches", []) or []:
-            out.append(
-                {
-                    "id": m.id,
-                    "score": m.score,
-                    "text": m.metadata.get("text", "") if m.metadata else "",
-                    "metadata": dict(m.metadata) if m.metadata else {},
-                }
-            )
+            # The response owns its metadata dicts; reference them, don't copy
+            md = m.metadata or {}
+            out.append({"id": m.id, "score": m.score, "text": md.get("text", ""), "metadata": md})
         return out
+
+    def query(self, q: str, top_k: int = 8) -> List[Dict]:
+        if self.cache is not None:
+            hits = self.cache.get_exact(q, top_k)
+            if hits is not None:
+                return hits
+        if self._batcher is not None:
+            vec = self._batcher.embed(q)
+        else:
+            vec = self.embed.embed([q], mode="query")[0]
+        if self.cache is None:
+            return self._search(vec, top_k)
+        hits = self.cache.get(vec, top_k)
+        if hits is None:
+            hits = self._search(vec, top_k)
+            self.cache.put(q, vec, top_k, hits)
+        return hits
+
+    def query_batch(self, qs: List[str], top_k: int = 8) -> List[List[Dict]]:
+        """Embed all questions in one call, then query Pinecone concurrently."""
+        if not qs:
+            return []
+        vecs = self.embed.embed(qs, mode="query")
+        workers = min(len(qs), self.query_concurrency)
+        with ThreadPoolExecutor(max_workers=workers) as ex:
+            return list(ex.map(lambda v: self._search(v, top_k), vecs))
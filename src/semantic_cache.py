@@ -0,0 +1,106 @@
+import time
+from collections import OrderedDict
+from threading import Lock
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+
+class SemanticCache:
+    """
+    LRU + TTL cache of retrieval hits in front of the vector index.
+
+    Two tiers: an exact-match map keyed by (question, top_k) that is checked
+    before any embedding work, and a semantic tier that returns the hits of a
+    previously seen question whose query embedding has cosine similarity
+    >= `tau` with the new one. Embeddings live in a preallocated row matrix,
+    so a lookup is a single matrix-vector product.
+
+    The semantic tier is off when `tau` is None: near-identical questions can
+    still ask about different articles ("მუხლი 12" vs "მუხლი 13").
+    """
+
+    def __init__(
+        self,
+        dim: int,
+        max_size: int = 1024,
+        ttl: float = 300.0,
+        tau: Optional[float] = None,
+        exact_size: int = 256,
+    ) -> None:
+        self.ttl = ttl
+        self.tau = tau
+        self.max_size = max_size
+        self.exact_size = exact_size
+        self._lock = Lock()
+        self._vecs = np.zeros((max_size if tau is not None else 0, dim), dtype=np.float32)
+        self._valid = np.zeros(len(self._vecs), dtype=bool)
+        self._free = list(range(len(self._vecs) - 1, -1, -1))
+        # slot -> (top_k, hits, timestamp), in LRU order
+        self._entries: "OrderedDict[int, Tuple[int, List[Dict], float]]" = OrderedDict()
+        # (question, top_k) -> (hits, timestamp), in LRU order
+        self._exact: "OrderedDict[Tuple[str, int], Tuple[List[Dict], float]]" = OrderedDict()
+
+    def _expired(self, ts: float) -> bool:
+        return time.monotonic() - ts > self.ttl
+
+    def get_exact(self, q: str, top_k: int) -> Optional[List[Dict]]:
+        with self._lock:
+            item = self._exact.get((q, top_k))
+            if item is None:
+                return None
+            hits, ts = item
+            if self._expired(ts):
+                del self._exact[(q, top_k)]
+                return None
+            self._exact.move_to_end((q, top_k))
+            return list(hits)
+
+    def get(self, vec: Sequence[float], top_k: int) -> Optional[List[Dict]]:
+        if self.tau is None:
+            return None
+        v = _normalize(vec)
+        with self._lock:
+            if not self._entries:
+                return None
+            sims = self._vecs @ v
+            sims[~self._valid] = -np.inf
+            slot = int(np.argmax(sims))
+            if sims[slot] < self.tau:
+                return None
+            cached_k, hits, ts = self._entries[slot]
+            if self._expired(ts):
+                self._evict(slot)
+                return None
+            if cached_k < top_k:
+                return None
+            self._entries.move_to_end(slot)
+            return hits[:top_k]
+
+    def put(self, q: str, vec: Sequence[float], top_k: int, hits: List[Dict]) -> None:
+        now = time.monotonic()
+        with self._lock:
+            self._exact[(q, top_k)] = (hits, now)
+            self._exact.move_to_end((q, top_k))
+            while len(self._exact) > self.exact_size:
+                self._exact.popitem(last=False)
+
+            if self.tau is None:
+                return
+            if not self._free:
+                self._evict(next(iter(self._entries)))
+            slot = self._free.pop()
+            self._vecs[slot] = _normalize(vec)
+            self._valid[slot] = True
+            self._entries[slot] = (top_k, hits, now)
+
+    def _evict(self, slot: int) -> None:
+        del self._entries[slot]
+        self._valid[slot] = False
+        self._free.append(slot)
+
+
+def _normalize(vec: Sequence[float]) -> np.ndarray:
+    v = np.asarray(vec, dtype=np.float32)
+    norm = float(np.linalg.norm(v))
+    return v / norm if norm > 0 else v
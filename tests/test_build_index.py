@@ -0,0 +1,41 @@
+import sys
+from pathlib import Path
+from types import SimpleNamespace
+
+SRC_DIR = Path(__file__).resolve().parent.parent / "src"
+if str(SRC_DIR) not in sys.path:
+    sys.path.insert(0, str(SRC_DIR))
+
+from build_index import _delete_stale
+
+
+class _FakeIndex:
+    def __init__(self, ids, wrap=False):
+        self.ids = list(ids)
+        self.wrap = wrap
+        self.deleted = []
+
+    def list(self, prefix):
+        page = [i for i in self.ids if i.startswith(prefix)]
+        # pinecone 5.x-7.x yield plain ids, 10.x yields ListItem objects
+        yield [SimpleNamespace(id=i) for i in page] if self.wrap else page
+
+    def delete(self, ids):
+        self.deleted.extend(ids)
+
+
+_IDS = ["law-0-5", "law-5-9", "law-9-14", "law-2-0-5", "lawyer-0-5"]
+
+
+def test_delete_stale_removes_only_own_unkept_ids():
+    for wrap in (False, True):
+        index = _FakeIndex(_IDS, wrap=wrap)
+        removed = _delete_stale(index, "law", keep={"law-5-9"})
+        assert sorted(index.deleted) == ["law-0-5", "law-9-14"]
+        assert removed == 2
+
+
+def test_delete_stale_keeps_everything_just_upserted():
+    index = _FakeIndex(_IDS)
+    assert _delete_stale(index, "law", keep={"law-0-5", "law-5-9", "law-9-14"}) == 0
+    assert index.deleted == []
@@ -0,0 +1,32 @@
+import sys
+from pathlib import Path
+
+SRC_DIR = Path(__file__).resolve().parent.parent / "src"
+if str(SRC_DIR) not in sys.path:
+    sys.path.insert(0, str(SRC_DIR))
+
+from chunking import iter_chunks
+
+
+def _paged_text(pages: int = 6, sentences: int = 30) -> str:
+    # extract_pdf leaves "\n\n\n" between pages
+    return "\n\n\n".join(
+        " ".join(f"Sentence {i} on page {p} says something." for i in range(sentences))
+        for p in range(pages)
+    )
+
+
+def test_page_breaks_do_not_repeat_chunk_ends():
+    text = _paged_text()
+    chunks = list(iter_chunks(text, target_tokens=60, overlap_tokens=20))
+    ends = [c.end for c in chunks]
+    assert ends == sorted(set(ends))
+
+
+def test_chunks_cover_text_without_gaps():
+    text = _paged_text()
+    chunks = list(iter_chunks(text, target_tokens=60, overlap_tokens=20))
+    assert chunks[0].start == 0
+    assert chunks[-1].end == len(text)
+    for prev, cur in zip(chunks, chunks[1:]):
+        assert prev.start < cur.start <= prev.end
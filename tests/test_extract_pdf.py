@@ -0,0 +1,31 @@
+import sys
+from pathlib import Path
+
+import fitz
+
+SRC_DIR = Path(__file__).resolve().parent.parent / "src"
+if str(SRC_DIR) not in sys.path:
+    sys.path.insert(0, str(SRC_DIR))
+
+import extract_pdf
+
+
+def _make_pdf(path: Path, tag: str, pages: int = 3) -> str:
+    doc = fitz.open()
+    for i in range(pages):
+        doc.new_page().insert_text((72, 72), f"{tag}{i}")
+    doc.save(str(path))
+    doc.close()
+    return str(path)
+
+
+def test_worker_doc_cache_switches_between_pdfs(tmp_path):
+    a = _make_pdf(tmp_path / "a.pdf", "a")
+    b = _make_pdf(tmp_path / "b.pdf", "b")
+    try:
+        assert extract_pdf._extract_pages(a, 0, 2).split() == ["a0", "a1"]
+        assert extract_pdf._extract_pages(b, 0, 2).split() == ["b0", "b1"]
+        assert extract_pdf._extract_pages(a, 1, 3).split() == ["a1", "a2"]
+    finally:
+        extract_pdf._close_worker_doc()
+    assert extract_pdf._worker_doc is None